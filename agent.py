@@ -0,0 +1,662 @@
+import os
+import atexit
+import asyncio
+import time
+import hashlib
+import weakref
+import threading
+import functools
+import multiprocessing
+import httpx
+import diskcache
+import tiktoken
+import trafilatura
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Literal, TypedDict, Annotated
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from dotenv import load_dotenv
+
+# LangChain / LangGraph imports
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import SystemMessage, HumanMessage
+from langgraph.graph import StateGraph, END
+from langgraph.types import Command, Send
+from duckduckgo_search import DDGS
+
+# Load environment variables (for GOOGLE_API_KEY)
+load_dotenv()
+
+# --- Configuration ---
+# Using the requested Gemini 2.5 Flash model
+MODEL_NAME = "gemini-2.5-flash"
+
+# HTTP settings for scraping search results
+FETCH_TIMEOUT = 10  # seconds
+USER_AGENT = "Mozilla/5.0 (compatible; DeepResearchAgent/1.0)"
+MAX_CONNECTIONS = 20
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# Downloads stop at this size: lxml parse time grows with the page size and recovers from truncated markup
+MAX_HTML_BYTES = 512 * 1024
+# Skip the comment and table subtrees, which are expensive to parse and rarely part of the main text
+EXTRACT_OPTIONS = {"favor_precision": True, "include_comments": False, "include_tables": False}
+
+# URLs are normalized before deduplication: these query parameters only track the click
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src"}
+# Search results with these extensions are documents or media, not pages trafilatura can extract
+NON_HTML_EXTENSIONS = (".pdf", ".doc", ".docx", ".ppt", ".pptx", ".xls", ".xlsx", ".zip", ".jpg", ".png", ".mp3", ".mp4")
+
+# Scraped text sent to the summarizer is capped per query, across all of its sources
+SCRAPE_TOKEN_BUDGET = 6000
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Plans, search results, extracted page text, summaries and reports are cached on disk across runs and sessions
+CACHE_DIR = ".research_cache"
+CACHE_EXPIRE = 24 * 60 * 60  # seconds
+# Extracted pages are reused without a request for CACHE_EXPIRE, then revalidated
+# with their ETag/Last-Modified until they are dropped after PAGE_CACHE_EXPIRE
+PAGE_CACHE_EXPIRE = 7 * 24 * 60 * 60  # seconds
+
+# --- State Definition ---
+def merge_by_query(left: Dict[str, str], right: Dict[str, str]) -> Dict[str, str]:
+    """
+    Reducer for per-query results: merges the updates of parallel branches by query,
+    so a query that is processed twice (e.g. a retry) overwrites its earlier result.
+    """
+    return {**left, **right}
+
+class AgentState(TypedDict):
+    """
+    The state of our Deep Research Agent.
+    """
+    topic: str
+    plan: List[str]
+    # Search results per query, deduplicated across the whole plan
+    sources: Dict[str, List[dict]]
+    # Annotated[...] allows each parallel research branch to return {query: scraped text} and have it merged in
+    findings: Annotated[Dict[str, str], merge_by_query]
+    summaries: Annotated[Dict[str, str], merge_by_query]
+    final_report: str
+
+class ResearchState(TypedDict):
+    """
+    The payload sent to each parallel Research Node branch.
+    """
+    topic: str
+    query: str
+    sources: List[dict]
+
+# --- LLM Initialization ---
+# The client, the result cache and the warm-up are created on first use rather than at import,
+# so importing this module has no side effects beyond defining the graph.
+_llm = None
+_warm_up_started = False
+# The nodes, the warm-up and the search threads may all ask for the client or cache at once
+_init_lock = threading.Lock()
+
+def get_llm() -> ChatGoogleGenerativeAI:
+    """
+    Returns the shared Gemini client, creating it on first call.
+    Ensure GOOGLE_API_KEY is available in os.environ before calling.
+    """
+    global _llm
+    with _init_lock:
+        if _llm is None:
+            _llm = ChatGoogleGenerativeAI(model=MODEL_NAME, temperature=0)
+    return _llm
+
+def warm_up_llm():
+    """
+    Establishes the connection to Gemini (channel + auth) ahead of the first real request.
+    Counting tokens goes through the same client as the planner's call but generates nothing.
+    """
+    try:
+        get_llm().get_num_tokens("ping")
+    except Exception as e:
+        print(f"[Warm-up] Could not reach Gemini: {e}")
+
+def start_warm_up():
+    """
+    Warms up Gemini in a background thread (once), so the caller does not wait on the network.
+    Does nothing until GOOGLE_API_KEY is set.
+    """
+    global _warm_up_started
+    with _init_lock:
+        if _warm_up_started or not os.environ.get("GOOGLE_API_KEY"):
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up_llm, daemon=True).start()
+
+# --- Extraction Pool ---
+# trafilatura.extract is CPU-bound lxml parsing that holds the GIL, so it runs in worker processes.
+# The pool is created lazily on first use so importing this module (e.g. from Streamlit) starts no processes.
+# Workers come from a forkserver rather than a fork of this process: by the time the pool is needed,
+# Streamlit, the LLM warm-up and the search worker threads are running and may be holding locks.
+# Every worker still imports the entry script (__main__) as __mp_main__, whatever the preload list is.
+# That is why the CLI entry point (main.py) is a thin script that only imports this module once it
+# runs as the CLI, and why this module creates its client, cache and warm-up lazily.
+# (Under Streamlit the entry script is the streamlit launcher, which workers re-import instead.)
+_extract_pool = None
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared extraction pool, creating it on first call.
+    """
+    global _extract_pool
+    if _extract_pool is None:
+        context = multiprocessing.get_context("forkserver")
+        # Preload trafilatura in the server so each forked worker already has it imported
+        context.set_forkserver_preload(["trafilatura"])
+        _extract_pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=context)
+        atexit.register(_extract_pool.shutdown, cancel_futures=True)
+    return _extract_pool
+
+# --- Result Cache ---
+# diskcache is process-safe and lives outside Streamlit's session state,
+# so repeated topics (and repeated queries within new topics) skip work already done.
+_cache = None
+
+def get_cache() -> diskcache.Cache:
+    """
+    Returns the shared result cache, opening it on first call.
+    """
+    global _cache
+    with _init_lock:
+        if _cache is None:
+            _cache = diskcache.Cache(CACHE_DIR)
+    return _cache
+
+def cache_key(kind: str, *parts: str) -> str:
+    """
+    Builds a cache key from the kind of result and the inputs that produced it.
+    """
+    digest = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return f"{kind}:{digest}"
+
+def page_cache_key(url: str) -> str:
+    """
+    Builds the cache key of an extracted page from its normalized URL and the
+    extraction options, so changing EXTRACT_OPTIONS never serves stale extractions.
+    """
+    return cache_key("page", normalize_url(url), repr(sorted(EXTRACT_OPTIONS.items())))
+
+# --- HTTP Client ---
+# One pooled HTTP/2 client is shared by every research branch so connections to the same
+# origin are reused instead of paying a TCP+TLS handshake per URL.
+# httpx clients are bound to the event loop they first run on, and each research run
+# (CLI or Streamlit submit) gets a fresh loop, so one client is kept per running loop.
+_http_clients = weakref.WeakKeyDictionary()
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared HTTP client for the running event loop, creating it on first call.
+    """
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=FETCH_TIMEOUT,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+        )
+        _http_clients[loop] = client
+    return client
+
+async def close_http_client():
+    """
+    Closes the shared HTTP client of the running event loop (call before the loop ends).
+    """
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+# --- Search & Scraping Helpers ---
+
+def search_duckduckgo(query: str) -> List[dict]:
+    """
+    Searches DuckDuckGo and returns the top 3 results (blocking, cached by query).
+    """
+    key = cache_key("search", query)
+    results = get_cache().get(key)
+    if results is None:
+        with DDGS() as ddgs:
+            results_gen = ddgs.text(query, max_results=3)
+            results = list(results_gen) if results_gen else []
+        # Empty results are often a rate limit, so only real results are cached
+        if results:
+            get_cache().set(key, results, expire=CACHE_EXPIRE)
+    return results
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL into a deduplication key: lowercases the scheme and host,
+    drops the fragment and strips tracking query parameters.
+    The key is for comparison only and is never fetched.
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+async def fetch_html(client: httpx.AsyncClient, url: str, cached_page=None):
+    """
+    Downloads a page and returns {"html" (raw bytes), "etag", "last_modified"}, or None if it could not be fetched.
+    The body is only read once the headers confirm it is an HTML page,
+    and reading stops after MAX_HTML_BYTES.
+    If cached_page has an ETag or Last-Modified, the request is conditional and a
+    304 Not Modified returns cached_page itself without downloading the body.
+    """
+    headers = {}
+    if cached_page:
+        if cached_page.get("etag"):
+            headers["If-None-Match"] = cached_page["etag"]
+        if cached_page.get("last_modified"):
+            headers["If-Modified-Since"] = cached_page["last_modified"]
+    
+    try:
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and cached_page:
+                return cached_page
+            
+            if response.status_code != 200:
+                print(f"     [Skipped] Failed to fetch URL ({response.status_code}): {url}")
+                return None
+            
+            content_type = response.headers.get("content-type", "").lower()
+            if not content_type.startswith(HTML_CONTENT_TYPES):
+                print(f"     [Skipped] Not an HTML page ({content_type or 'unknown type'}): {url}")
+                return None
+            
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= MAX_HTML_BYTES:
+                    break
+            
+            # Kept as raw bytes: trafilatura detects the encoding itself, including a charset
+            # declared only in <meta>, which httpx (header charset or UTF-8) would get wrong
+            return {
+                "html": bytes(body[:MAX_HTML_BYTES]),
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+            }
+    except Exception as e:
+        print(f"     [Error] Scraping failed for {url}: {e}")
+        return None
+
+# --- Scraped Text Packing ---
+# Token counts are an approximation of Gemini's tokenizer, good enough for budgeting the prompt.
+# tiktoken downloads the encoding on first use, so it is loaded lazily (and off the event loop,
+# see research_node); if it cannot be loaded, e.g. offline, counts fall back to ~4 chars per token.
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    """
+    Returns the tiktoken encoding, or None if it could not be loaded.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    print(f"[Tokenizer] Could not load '{TOKENIZER_ENCODING}', approximating token counts: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens in a piece of text (approximately if the encoding is unavailable).
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode_ordinary(text))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts a piece of text down to at most max_tokens tokens (approximately if the encoding is unavailable).
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode_ordinary(text)[:max_tokens])
+
+def pack_sources(extracted: List[tuple]) -> str:
+    """
+    Combines the extracted text of a query's sources into a single prompt-ready string.
+    - Paragraphs that already appeared in another source (cookie banners, navigation) are dropped.
+    - Paragraphs are taken from each source in turn until SCRAPE_TOKEN_BUDGET is spent,
+      so one long page cannot crowd out the others; a source's first paragraph is
+      truncated to its share of the budget if it does not fit whole.
+    """
+    seen_paragraphs = set()
+    sources = []
+    for url, text in extracted:
+        paragraphs = []
+        for paragraph in text.splitlines():
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            digest = hashlib.blake2b(" ".join(paragraph.lower().split()).encode(), digest_size=8).digest()
+            if digest not in seen_paragraphs:
+                seen_paragraphs.add(digest)
+                paragraphs.append(paragraph)
+        sources.append((url, paragraphs))
+
+    kept = [[] for _ in sources]
+    remaining = SCRAPE_TOKEN_BUDGET
+    share = SCRAPE_TOKEN_BUDGET // max(len(sources), 1)
+    depth = 0
+    while remaining > 0 and any(depth < len(paragraphs) for _, paragraphs in sources):
+        for i, (_, paragraphs) in enumerate(sources):
+            if depth < len(paragraphs):
+                paragraph = paragraphs[depth]
+                tokens = count_tokens(paragraph)
+                # trafilatura often emits a page's main text as a few very long lines, so a first
+                # paragraph over the source's fair share is cut down rather than dropped entirely
+                limit = min(remaining, share)
+                if depth == 0 and tokens > limit > 0:
+                    paragraph = truncate_to_tokens(paragraph, limit)
+                    tokens = limit
+                if tokens <= remaining:
+                    kept[i].append(paragraph)
+                    remaining -= tokens
+        depth += 1
+
+    # Append source metadata to text for the LLM
+    return "\n\n".join(
+        f"SOURCE: {url}\nCONTENT:\n" + "\n".join(paragraphs)
+        for (url, _), paragraphs in zip(sources, kept) if paragraphs
+    )
+
+# --- Nodes ---
+
+def planner_node(state: AgentState):
+    """
+    Planner Node: Breaks the user's topic into 3 distinct search queries.
+    """
+    topic = state["topic"]
+    print(f"\n--- [PLANNER] Generating search queries for: '{topic}' ---")
+    
+    system_instruction = (
+        "You are a research planner. Break down the user's topic into 3 distinct, "
+        "search-optimized queries. Return ONLY the 3 queries, one per line. "
+        "Do not include numbering or bullet points."
+    )
+    
+    key = cache_key("plan", MODEL_NAME, topic)
+    plan = get_cache().get(key)
+    if plan is None:
+        response = get_llm().invoke([
+            SystemMessage(content=system_instruction), 
+            HumanMessage(content=topic)
+        ])
+        
+        # Parse the response into a clean list of queries
+        raw_plan = response.content.strip().split('\n')
+        # Duplicate queries are dropped: the searcher keys sources by query, and a repeat
+        # would have its own results discarded as duplicates of themselves
+        plan = list(dict.fromkeys(line.strip() for line in raw_plan if line.strip()))[:3]
+        if plan:
+            get_cache().set(key, plan, expire=CACHE_EXPIRE)
+    
+    print(f"Plan generated: {plan}")
+    
+    return {"plan": plan}
+
+async def search_node(state: AgentState) -> Command[Literal["researcher", "summarizer"]]:
+    """
+    Search Node: Searches DuckDuckGo for every query concurrently and removes
+    duplicate and non-HTML results across the whole plan before anything is fetched.
+    It then fans out directly: every query, with its search results, is sent to its own
+    Research Node branch so they run concurrently.
+    """
+    plan = state["plan"]
+    print(f"\n--- [SEARCHER] Searching DuckDuckGo for {len(plan)} queries ---")
+    
+    # DDGS is synchronous, so each search runs in a worker thread
+    results = await asyncio.gather(
+        *[asyncio.to_thread(search_duckduckgo, query) for query in plan],
+        return_exceptions=True,
+    )
+    
+    # Walk the results in plan order so earlier queries keep the URLs they share with later ones
+    seen_urls = set()
+    sources = {}
+    for query, search_results in zip(plan, results):
+        sources[query] = []
+        if isinstance(search_results, Exception):
+            print(f"  [Error] Search failed for '{query}': {search_results}")
+            continue
+        
+        for result in search_results:
+            if not result.get('href'):
+                continue
+            
+            # The normalized URL is only the deduplication key; the original href is what
+            # gets fetched and cited, since rewriting it can break signed or encoded URLs
+            url_key = normalize_url(result['href'])
+            if url_key in seen_urls:
+                print(f"  [Skipped] Duplicate result: {result['href']}")
+                continue
+            seen_urls.add(url_key)
+            
+            if urlsplit(url_key).path.lower().endswith(NON_HTML_EXTENSIONS):
+                print(f"  [Skipped] Not an HTML page: {result['href']}")
+                continue
+            
+            sources[query].append(result)
+    
+    # Routing with Command saves the separate conditional-edge callback and its state pass
+    if not plan:
+        return Command(update={"sources": sources}, goto="summarizer")
+    return Command(
+        update={"sources": sources},
+        goto=[
+            Send("researcher", {"topic": state["topic"], "query": query, "sources": sources[query]})
+            for query in plan
+        ],
+    )
+
+async def research_node(state: ResearchState):
+    """
+    Research Node (one parallel branch per query):
+    - Takes the query and its deduplicated search results from the Send payload.
+    - Scrapes content (all URLs fetched concurrently).
+    Summarization is left to the Summarizer Node, which summarizes all queries together.
+    """
+    query = state["query"]
+    
+    print(f"\n--- [RESEARCHER] Processing Query: '{query}' ---")
+    
+    search_results = state["sources"]
+
+    # Pages extracted within CACHE_EXPIRE are reused without a request; the rest are fetched
+    # concurrently (conditionally, if an older cached copy has validators) and then extracted
+    keys = [page_cache_key(result['href']) for result in search_results]
+    cached_pages = [get_cache().get(key) for key in keys]
+    texts = [None] * len(search_results)
+    to_fetch = []
+    for i, (result, cached_page) in enumerate(zip(search_results, cached_pages)):
+        if cached_page and time.time() - cached_page["fetched_at"] < CACHE_EXPIRE:
+            print(f"  -> Reusing cached page: {result.get('title', 'No Title')} ({result['href']})")
+            texts[i] = cached_page["text"]
+        else:
+            print(f"  -> Scraping: {result.get('title', 'No Title')} ({result['href']})")
+            to_fetch.append(i)
+
+    client = get_http_client()
+    fetched = await asyncio.gather(
+        *[fetch_html(client, search_results[i]['href'], cached_pages[i]) for i in to_fetch]
+    )
+
+    misses = []
+    for i, page in zip(to_fetch, fetched):
+        if page is None:
+            continue
+        if page is cached_pages[i]:
+            # 304 Not Modified: keep the cached extraction and restart its freshness window
+            texts[i] = page["text"]
+            get_cache().set(keys[i], {**page, "fetched_at": time.time()}, expire=PAGE_CACHE_EXPIRE)
+        else:
+            misses.append((i, page))
+
+    # Parse the downloaded HTML in parallel across worker processes
+    if misses:
+        loop = asyncio.get_running_loop()
+        pool = get_extract_pool()
+        extract = functools.partial(trafilatura.extract, **EXTRACT_OPTIONS)
+        extractions = await asyncio.gather(
+            *[loop.run_in_executor(pool, extract, page["html"]) for _, page in misses],
+            return_exceptions=True,
+        )
+        for (i, page), text in zip(misses, extractions):
+            if isinstance(text, Exception):
+                print(f"     [Error] Extraction failed for {search_results[i]['href']}: {text}")
+                continue
+            texts[i] = text or ""
+            get_cache().set(keys[i], {
+                "text": texts[i],
+                "etag": page["etag"],
+                "last_modified": page["last_modified"],
+                "fetched_at": time.time(),
+            }, expire=PAGE_CACHE_EXPIRE)
+
+    extracted = []
+    for result, text in zip(search_results, texts):
+        if text:
+            extracted.append((result['href'], text))
+        elif text == "":
+            print(f"     [Skipped] No main text found: {result['href']}")
+
+    # Deduplicate boilerplate and fit the sources into the token budget to avoid context overflow
+    # Runs in a worker thread: the first call may download the encoding, and tokenizing is CPU work
+    combined_text = await asyncio.to_thread(pack_sources, extracted)
+    if not combined_text:
+        print("  -> No content scraped.")
+
+    # Return update to state
+    # The merge_by_query reducer merges these findings with those from the other branches
+    return {"findings": {query: combined_text}}
+
+async def summarizer_node(state: AgentState):
+    """
+    Summarizer Node: Summarizes the findings of every query with one llm.abatch call.
+    abatch sends one concurrent request per query (not a single provider call), so the
+    summaries take about as long as the slowest one.
+    Trade-off: the node is a barrier after the fan-out, so no summary starts until the
+    slowest branch has finished scraping; summarizing inside each branch would overlap
+    one query's summary with another's scrape, at the cost of scattering the LLM calls.
+    """
+    print("\n--- [SUMMARIZER] Summarizing findings with Gemini ---")
+    
+    findings = state.get("findings", {})
+    
+    summaries = {}
+    prompts = {}
+    for query in state["plan"]:
+        combined_text = findings.get(query, "")
+        if not combined_text:
+            summaries[query] = f"No detailed information could be scraped for the query: {query}"
+            print(f"  -> No content scraped for '{query}'. Skipping summary.")
+            continue
+        
+        summary_prompt = (
+            f"You are a research assistant. Analyze the following scraped text for the query: '{query}'. "
+            f"Provide a concise, fact-heavy summary of the key information found. "
+            f"Ignore irrelevant navigation or boilerplate text.\n\n"
+            f"{combined_text}"
+        )
+        cached_summary = get_cache().get(cache_key("summary", MODEL_NAME, summary_prompt))
+        if cached_summary is not None:
+            summaries[query] = cached_summary
+            print(f"  -> Reusing cached summary for '{query}'.")
+        else:
+            prompts[query] = summary_prompt
+
+    # Only the queries without a cached summary go to the LLM
+    if prompts:
+        # Concurrent requests, one per query
+        responses = await get_llm().abatch([[HumanMessage(content=prompt)] for prompt in prompts.values()])
+        for (query, prompt), response in zip(prompts.items(), responses):
+            summaries[query] = response.content
+            get_cache().set(cache_key("summary", MODEL_NAME, prompt), response.content, expire=CACHE_EXPIRE)
+
+    return {"summaries": summaries}
+
+async def writer_node(state: AgentState):
+    """
+    Writer Node: Takes all summaries and writes the final report.
+    The report is streamed token by token so the UI can render it as it is written.
+    """
+    print("\n--- [WRITER] Composing Final Report ---")
+    topic = state["topic"]
+    # Keep the summaries in plan order, whichever branch finished first
+    summaries_by_query = state.get("summaries", {})
+    summaries = [summaries_by_query[query] for query in state["plan"] if query in summaries_by_query]
+    
+    # Combine all summaries
+    research_context = "\n\n---\n\n".join(summaries)
+    
+    prompt = (
+        f"You are a professional technical writer. The user asked for a report on: '{topic}'.\n"
+        f"Below are the summaries from the research phase:\n\n"
+        f"{research_context}\n\n"
+        f"Write a comprehensive, well-structured Markdown report based ONLY on the above findings. "
+        f"Include a Title, Introduction, Key Findings (structured appropriately), and Conclusion."
+    )
+    
+    # A cached report is returned whole; only a freshly written one is streamed
+    key = cache_key("report", MODEL_NAME, prompt)
+    final_report = get_cache().get(key)
+    if final_report is None:
+        final_report = ""
+        async for chunk in get_llm().astream([HumanMessage(content=prompt)]):
+            final_report += chunk.content
+        get_cache().set(key, final_report, expire=CACHE_EXPIRE)
+    
+    return {"final_report": final_report}
+
+# --- Graph Construction ---
+
+workflow = StateGraph(AgentState)
+
+# Add Nodes
+workflow.add_node("planner", planner_node)
+workflow.add_node("searcher", search_node)
+workflow.add_node("researcher", research_node)
+workflow.add_node("summarizer", summarizer_node)
+workflow.add_node("writer", writer_node)
+
+# Set Entry Point
+workflow.set_entry_point("planner")
+
+# Add Edges
+# (the searcher routes itself to the researcher branches with Command/Send)
+workflow.add_edge("planner", "searcher")
+
+# The summarizer runs once all parallel research branches have finished
+workflow.add_edge("researcher", "summarizer")
+workflow.add_edge("summarizer", "writer")
+
+# End Edge
+workflow.add_edge("writer", END)
+
+# Compile the graph
+app = workflow.compile()
+
+async def run_graph(initial_state):
+    """
+    Runs the graph to completion and releases the shared HTTP client afterwards.
+    """
+    try:
+        return await app.ainvoke(initial_state)
+    finally:
+        await close_http_client()
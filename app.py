@@ -1,44 +1,196 @@
 import streamlit as st
 import os
-import markdown
-from xhtml2pdf import pisa
-from io import BytesIO
-from main import app as graph_app  # Import the compiled graph
+import asyncio
+import time
+import functools
+import importlib
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables (for GOOGLE_API_KEY) here too, since the agent is only imported later
+load_dotenv()
+
+# --- Lazy Loaders ---
+# Streamlit re-executes this script on every interaction, so the heavy dependencies
+# (LangGraph, LangChain, trafilatura, WeasyPrint) are only imported on first use
+# and the loaded objects are kept across reruns with st.cache_resource.
+@st.cache_resource(show_spinner="Loading research agent...")
+def load_agent():
+    """
+    Imports the agent module (and with it the compiled graph) on first use.
+    """
+    import agent
+    return agent
+
+def import_and_warm_up_agent():
+    """
+    Imports the agent module and starts its Gemini warm-up.
+    """
+    importlib.import_module("agent").start_warm_up()
+
+@st.cache_resource(show_spinner=False)
+def preload_agent():
+    """
+    Starts importing the agent module in a background thread (once per server process),
+    so the import and the Gemini warm-up happen while the user is still typing.
+    load_agent() then finds the module already imported (or waits on the import lock).
+    """
+    thread = threading.Thread(target=import_and_warm_up_agent, daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource(show_spinner=False)
+def get_markdown_parser():
+    """
+    Builds the Markdown parser once; its setup is the expensive part of rendering.
+    Tables and strikethrough are enabled to match the GFM that st.markdown renders.
+    """
+    from markdown_it import MarkdownIt
+    return MarkdownIt("commonmark", {"html": False}).enable(["table", "strikethrough"])
+
+# --- Chat History Rendering ---
+# Only the most recent messages are rendered by default; older ones are behind a toggle
+HISTORY_VISIBLE_MESSAGES = 10
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_markdown(markdown_content):
+    """
+    Converts a chat message to HTML once, so reruns reuse it instead of re-parsing the Markdown.
+    """
+    return get_markdown_parser().render(markdown_content)
+
+def display_message(message):
+    """
+    Renders a single chat message from its cached HTML.
+    """
+    with st.chat_message(message["role"]):
+        # st.html output is not wrapped in .stMarkdown, so it gets its own class for the chat CSS
+        st.html(f'<div class="chat-history-markdown">{render_markdown(message["content"])}</div>')
 
 # --- PDF Generation Utility ---
+# The report styling and page template are fixed, so they are defined once instead of per report
+PDF_CSS = """
+body { font-family: Helvetica, sans-serif; font-size: 12px; }
+h1 { color: #333; font-size: 24px; }
+h2 { color: #444; font-size: 20px; }
+h3 { color: #555; font-size: 16px; }
+p { line-height: 1.5; }
+code { background-color: #f4f4f4; padding: 2px; }
+pre { background-color: #f4f4f4; padding: 10px; }
+"""
+PDF_HTML_PREFIX = "<html><head><meta charset=\"utf-8\"></head><body>"
+PDF_HTML_SUFFIX = "</body></html>"
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_stylesheet():
+    """
+    Parses the PDF stylesheet once and reuses it for every report.
+    """
+    from weasyprint import CSS
+    return CSS(string=PDF_CSS)
+
+@st.cache_data(max_entries=16, show_spinner=False)
 def convert_markdown_to_pdf(markdown_content):
     """
     Converts Markdown text to PDF bytes.
+    Cached by the Markdown content so reruns reuse the PDF instead of re-rendering it.
     """
     # Convert Markdown to HTML
-    html_content = markdown.markdown(markdown_content)
+    html_content = get_markdown_parser().render(markdown_content)
     
-    # Add some basic styling for the PDF
-    styled_html = f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Helvetica, sans-serif; font-size: 12px; }}
-            h1 {{ color: #333; font-size: 24px; }}
-            h2 {{ color: #444; font-size: 20px; }}
-            h3 {{ color: #555; font-size: 16px; }}
-            p {{ line-height: 1.5; }}
-            code {{ background-color: #f4f4f4; padding: 2px; }}
-            pre {{ background-color: #f4f4f4; padding: 10px; }}
-        </style>
-    </head>
-    <body>
-        {html_content}
-    </body>
-    </html>
+    # WeasyPrint lays out the page with native libraries (Pango) and returns the PDF bytes
+    from weasyprint import HTML
+    document = HTML(string=PDF_HTML_PREFIX + html_content + PDF_HTML_SUFFIX)
+    return document.write_pdf(stylesheets=[get_pdf_stylesheet()])
+
+# --- Agent Runner ---
+# Status updates are re-rendered at most this often (~10 Hz) while the graph is streaming
+STATUS_FLUSH_INTERVAL = 0.1  # seconds
+# Streamed report tokens are re-rendered once this many characters or this much time has accumulated
+REPORT_FLUSH_CHARS = 32
+REPORT_FLUSH_INTERVAL = 0.05  # seconds
+
+async def run_agent(initial_state, status_container, report_placeholder):
     """
+    Streams the graph execution into the status container, renders the report into
+    the placeholder as the writer produces it, and returns the final report.
+    """
+    agent = load_agent()
+    final_report_text = ""
+    streamed_report = ""
+    report_flush_len = 0
+    report_flush_time = 0.0
+    plan = []
+    finished_queries = 0
+    
+    # Parallel branches emit events in bursts, so collect status lines and re-render
+    # a single placeholder on a throttle instead of writing a new element per event
+    status_log = status_container.empty()
+    status_lines = []
+    last_flush = 0.0
+    
+    def flush_status(force=False):
+        nonlocal last_flush
+        now = time.monotonic()
+        if force or now - last_flush >= STATUS_FLUSH_INTERVAL:
+            status_log.markdown("\n\n".join(status_lines))
+            last_flush = now
+    
+    # "updates" tells us which node finished and what it produced,
+    # "messages" carries the LLM tokens so the writer's report can be shown as it streams
+    try:
+        async for mode, event in agent.app.astream(initial_state, stream_mode=["updates", "messages"]):
+            
+            if mode == "messages":
+                message_chunk, metadata = event
+                if metadata.get("langgraph_node") != "writer":
+                    continue
+                
+                streamed_report += message_chunk.content
+                now = time.monotonic()
+                if (len(streamed_report) - report_flush_len >= REPORT_FLUSH_CHARS
+                        or now - report_flush_time >= REPORT_FLUSH_INTERVAL):
+                    report_placeholder.markdown(f"### 📝 Final Report\n\n{streamed_report}")
+                    report_flush_len = len(streamed_report)
+                    report_flush_time = now
+                continue
+            
+            # 'event' is a dictionary like {'planner': {...}} or {'researcher': {...}}
+            for node_name, state_update in event.items():
+                
+                if node_name == "planner":
+                    plan = state_update.get("plan", [])
+                    status_lines.append(f"✅ **Plan Created**: Generated {len(plan)} search queries.")
+                    status_lines.append(f"_{plan}_")
+                
+                elif node_name == "searcher":
+                    sources = state_update.get("sources", {})
+                    source_count = sum(len(results) for results in sources.values())
+                    status_lines.append(f"🌐 **Search Complete**: Found {source_count} unique sources.")
+                
+                elif node_name == "researcher":
+                    # Research branches run in parallel, so count them as they finish
+                    finished_queries += 1
+                    scraped_len = sum(len(content) for content in state_update.get("findings", {}).values())
+                    status_lines.append(f"🔍 **Research Step**: Finished Query {finished_queries}/{len(plan)}. (Scraped {scraped_len} chars)")
+                
+                elif node_name == "summarizer":
+                    summaries = state_update.get("summaries", {})
+                    status_lines.append(f"🧠 **Summaries Ready**: Summarized {len(summaries)} queries concurrently.")
+                
+                elif node_name == "writer":
+                    final_report_text = state_update.get("final_report", "")
+            
+            flush_status()
+    finally:
+        # Show any buffered status lines, also when the graph raised
+        flush_status(force=True)
+        # Release the pooled HTTP connections before asyncio.run closes this loop
+        await agent.close_http_client()
     
-    pdf_buffer = BytesIO()
-    pisa_status = pisa.CreatePDF(styled_html, dest=pdf_buffer)
+    status_container.update(label="Research Complete!", state="complete", expanded=False)
     
-    if pisa_status.err:
-        return None
-    return pdf_buffer.getvalue()
+    return final_report_text
 
 # --- Streamlit UI Configuration ---
 st.set_page_config(page_title="Deep Research Agent", page_icon="🕵️‍♂️", layout="wide")
@@ -50,10 +202,20 @@ st.markdown("""
         background-color: transparent; 
         border: none;
     }
-    .stChatMessage .stMarkdown {
+    .stChatMessage .stMarkdown,
+    .stChatMessage .chat-history-markdown {
         padding: 10px;
         border-radius: 10px;
     }
+    .chat-history-markdown table {
+        border-collapse: collapse;
+        margin-bottom: 0.5rem;
+    }
+    .chat-history-markdown th,
+    .chat-history-markdown td {
+        border: 1px solid rgba(255, 255, 255, 0.3);
+        padding: 4px 8px;
+    }
     div[data-testid="stChatMessageContent"] {
         background-color: #001f3f;
         border-radius: 10px;
@@ -78,11 +240,17 @@ with st.sidebar:
     if api_key:
         os.environ["GOOGLE_API_KEY"] = api_key
     
+    # Once a key is available, load the agent (and warm up Gemini) ahead of the first submit
+    if os.environ.get("GOOGLE_API_KEY"):
+        preload_agent()
+    
     st.divider()
     st.markdown("### How it works")
     st.markdown("1. **Planner**: Breaks topic into 3 queries.")
-    st.markdown("2. **Researcher**: Searches & scrapes web content.")
-    st.markdown("3. **Writer**: Compiles a final report.")
+    st.markdown("2. **Searcher**: Searches the web & drops duplicate sources.")
+    st.markdown("3. **Researcher**: Scrapes web content.")
+    st.markdown("4. **Summarizer**: Condenses every query's findings concurrently.")
+    st.markdown("5. **Writer**: Compiles a final report.")
 
 # --- Session State Management ---
 if "messages" not in st.session_state:
@@ -92,9 +260,16 @@ if "final_report" not in st.session_state:
     st.session_state.final_report = None
 
 # --- Display Chat History ---
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+older_messages = st.session_state.messages[:-HISTORY_VISIBLE_MESSAGES]
+recent_messages = st.session_state.messages[-HISTORY_VISIBLE_MESSAGES:]
+
+# A toggle (rather than an expander) keeps the older messages out of the page entirely until requested
+if older_messages and st.toggle(f"Show {len(older_messages)} older messages", key="show-older-messages"):
+    for message in older_messages:
+        display_message(message)
+
+for message in recent_messages:
+    display_message(message)
 
 # --- Main Chat Logic ---
 if prompt := st.chat_input("Enter your research topic..."):
@@ -110,36 +285,17 @@ if prompt := st.chat_input("Enter your research topic..."):
     # Agent Processing
     with st.chat_message("assistant"):
         status_container = st.status("Initializing Agent...", expanded=True)
+        report_placeholder = st.empty()
         final_report_text = ""
         
         try:
-            initial_state = {"topic": prompt, "plan": [], "current_query_index": 0, "summaries": []}
+            initial_state = {"topic": prompt, "plan": [], "sources": {}, "findings": {}, "summaries": {}}
             
-            # Stream the graph execution to show progress
-            # We use stream(mode="updates") to see which node finished and what it produced
-            for event in graph_app.stream(initial_state):
-                
-                # 'event' is a dictionary like {'planner': {...}} or {'researcher': {...}}
-                for node_name, state_update in event.items():
-                    
-                    if node_name == "planner":
-                        plan = state_update.get("plan", [])
-                        status_container.write(f"✅ **Plan Created**: Generated {len(plan)} search queries.")
-                        status_container.write(f"_{plan}_")
-                    
-                    elif node_name == "researcher":
-                        # The researcher node outputs the *new* index, so query just finished was index-1
-                        idx = state_update.get("current_query_index", 1) - 1
-                        summary_len = len(state_update.get("summaries", [""])[0])
-                        status_container.write(f"🔍 **Research Step**: Finished Query {idx+1}. (Scraped & Summarized {summary_len} chars)")
-                    
-                    elif node_name == "writer":
-                        final_report_text = state_update.get("final_report", "")
-                        status_container.update(label="Research Complete!", state="complete", expanded=False)
+            # The research branches are async, so drive the graph with astream on an event loop
+            final_report_text = asyncio.run(run_agent(initial_state, status_container, report_placeholder))
             
-            # Show the final report
-            st.markdown("### 📝 Final Report")
-            st.markdown(final_report_text)
+            # Show the final report (replaces the partially streamed one)
+            report_placeholder.markdown(f"### 📝 Final Report\n\n{final_report_text}")
             
             # Save to session state
             st.session_state.messages.append({"role": "assistant", "content": final_report_text})
@@ -154,12 +310,12 @@ if st.session_state.final_report:
     st.divider()
     col1, col2 = st.columns([1, 4])
     with col1:
-        pdf_bytes = convert_markdown_to_pdf(st.session_state.final_report)
-        if pdf_bytes:
-            st.download_button(
-                label="📥 Download PDF Report",
-                data=pdf_bytes,
-                file_name="research_report.pdf",
-                mime="application/pdf",
-                key="download-pdf"
-            )
+        # Passing a callable defers PDF generation until the button is actually clicked
+        st.download_button(
+            label="📥 Download PDF Report",
+            data=functools.partial(convert_markdown_to_pdf, st.session_state.final_report),
+            file_name="research_report.pdf",
+            mime="application/pdf",
+            on_click="ignore",
+            key="download-pdf"
+        )